@@ -7,6 +7,7 @@ import base64
 import requests
 import json
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import os
 
 # Import our custom modules
@@ -91,7 +92,7 @@ if 'image_uploaded' not in st.session_state:
     st.session_state.image_uploaded = False
 
 # Initialize models
-@st.cache_resource
+@st.cache_resource(ttl=None, show_spinner=False)
 def load_models():
     """Load ML models with caching"""
     try:
@@ -103,47 +104,98 @@ def load_models():
         st.error(f"Error loading models: {str(e)}")
         return None, None, None
 
-def process_image(image):
-    """Process uploaded image and estimate calories"""
+# Load models as soon as the script starts so the first analysis doesn't pay for it
+food_detector, calorie_estimator, image_processor = load_models()
+
+# Seconds to wait for an analysis before giving up
+ANALYSIS_TIMEOUT = 30
+
+# Uploads are shrunk to fit the image processor's target size once, right after decoding
+ANALYSIS_SIZE = ImageProcessor.target_size
+
+@st.cache_resource(ttl=None, show_spinner=False)
+def load_executor():
+    """Thread pool that runs image analysis off the Streamlit script thread"""
+    return ThreadPoolExecutor(max_workers=2)
+
+def run_pipeline(image):
+    """Preprocess, detect and estimate calories for an image (no Streamlit calls)"""
+    # Process the image
+    processed_image = image_processor.preprocess(image)
+    
+    # Detect food items
+    food_items = food_detector.detect_food(processed_image)
+    
+    # Estimate calories for all food items in one call
+    calories = calorie_estimator.estimate_batch(
+        [food_item['name'] for food_item in food_items],
+        [food_item['confidence'] for food_item in food_items],
+        [food_item.get('portion_size', 'medium') for food_item in food_items]
+    )
+    
+    results = [{
+        'food_name': food_item['name'],
+        'confidence': food_item['confidence'],
+        'calories': float(item_calories),
+        'portion_size': food_item.get('portion_size', 'medium')
+    } for food_item, item_calories in zip(food_items, calories)]
+    
+    total_calories = float(calories.sum())
+    
+    return {
+        'total_calories': round(total_calories, 1),
+        'food_items': results,
+        'timestamp': datetime.now().isoformat()
+    }
+
+def decode_image(image_bytes):
+    """Decode uploaded image bytes to a BGR array with OpenCV"""
+    image = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+    
+    if image is None:
+        # Fall back to PIL for formats OpenCV can't read (e.g. GIF)
+        rgb = np.asarray(Image.open(io.BytesIO(image_bytes)).convert('RGB'))
+        image = cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)
+    
+    return fit_image(image)
+
+def fit_image(image):
+    """Shrink a BGR array to fit within ANALYSIS_SIZE, keeping its aspect ratio"""
+    height, width = image.shape[:2]
+    target_width, target_height = ANALYSIS_SIZE
+    
+    scale = min(target_width / width, target_height / height)
+    if scale < 1:
+        # Keep both sides at least 1px for extreme aspect ratios
+        new_size = (max(1, int(width * scale)), max(1, int(height * scale)))
+        image = cv2.resize(image, new_size, interpolation=cv2.INTER_AREA)
+    
+    # Contiguous uint8 keeps every later OpenCV call on its fast path
+    return np.ascontiguousarray(image, dtype=np.uint8)
+
+@st.cache_data(show_spinner=False, ttl=24 * 60 * 60, max_entries=32)
+def analyze_image(image_bytes):
+    """Decode and analyze image bytes, caching results per image"""
+    image = decode_image(image_bytes)
+    
+    # OpenCV/NumPy release the GIL, so the pipeline runs in a worker thread
+    future = load_executor().submit(run_pipeline, image)
+    return future.result(timeout=ANALYSIS_TIMEOUT)
+
+def process_image(image_bytes):
+    """Process uploaded image bytes and estimate calories"""
     try:
-        # Load models
-        food_detector, calorie_estimator, image_processor = load_models()
-        
         if not all([food_detector, calorie_estimator, image_processor]):
             return None
         
-        # Process the image
-        processed_image = image_processor.preprocess(image)
-        
-        # Detect food items
-        food_items = food_detector.detect_food(processed_image)
-        
-        # Estimate calories for each food item
-        results = []
-        total_calories = 0
-        
-        for food_item in food_items:
-            calories = calorie_estimator.estimate_calories(
-                food_item['name'], 
-                food_item['confidence'],
-                food_item.get('portion_size', 'medium')
-            )
-            
-            results.append({
-                'food_name': food_item['name'],
-                'confidence': food_item['confidence'],
-                'calories': calories,
-                'portion_size': food_item.get('portion_size', 'medium')
-            })
-            
-            total_calories += calories
-        
-        return {
-            'total_calories': round(total_calories, 1),
-            'food_items': results,
-            'timestamp': datetime.now().isoformat()
-        }
+        # Errors are raised rather than returned, so failed analyses are never cached
+        results = analyze_image(image_bytes)
+        results['timestamp'] = datetime.now().isoformat()
+        return results
         
+    except FuturesTimeoutError:
+        st.error(f"Image analysis took longer than {ANALYSIS_TIMEOUT} seconds")
+        return None
     except Exception as e:
         st.error(f"Error processing image: {str(e)}")
         return None
@@ -204,13 +256,13 @@ def main():
             ["📷 Take Photo", "📁 Upload Image"]
         )
         
-        uploaded_image = None
+        image_bytes = None
         
         if upload_option == "📷 Take Photo":
             # Camera input
             camera_image = st.camera_input("Take a photo of your food")
             if camera_image:
-                uploaded_image = Image.open(camera_image)
+                image_bytes = camera_image.getvalue()
                 st.session_state.image_uploaded = True
         
         else:
@@ -222,18 +274,18 @@ def main():
             )
             
             if uploaded_file:
-                uploaded_image = Image.open(uploaded_file)
+                image_bytes = uploaded_file.getvalue()
                 st.session_state.image_uploaded = True
         
         # Display uploaded image
-        if uploaded_image:
+        if image_bytes:
             st.subheader("📷 Your Image")
-            st.image(uploaded_image, caption="Uploaded food image", use_column_width=True)
+            st.image(image_bytes, caption="Uploaded food image", use_column_width=True)
             
             # Process button
             if st.button("🔍 Analyze Food & Estimate Calories", type="primary"):
                 with st.spinner("🤖 AI is analyzing your food..."):
-                    results = process_image(uploaded_image)
+                    results = process_image(image_bytes)
                     if results:
                         st.session_state.results = results
                         st.success("✅ Analysis complete!")
@@ -1,5 +1,81 @@
 import json
 import os
+from types import MappingProxyType
+import numpy as np
+
+def _read_only_database(database):
+    """Copy a food database into read-only views, entries included"""
+    return MappingProxyType({name: MappingProxyType(dict(info))
+                             for name, info in database.items()})
+
+# Food database with calorie information, shared read-only by all estimators
+_FOOD_DB = _read_only_database({
+    # Fruits (per 100g)
+    'apple': {'calories_per_100g': 52, 'category': 'fruits'},
+    'banana': {'calories_per_100g': 89, 'category': 'fruits'},
+    'orange': {'calories_per_100g': 47, 'category': 'fruits'},
+    'strawberry': {'calories_per_100g': 32, 'category': 'fruits'},
+    'grape': {'calories_per_100g': 62, 'category': 'fruits'},
+    'lemon': {'calories_per_100g': 29, 'category': 'fruits'},
+    'mixed fruits': {'calories_per_100g': 50, 'category': 'fruits'},
+    
+    # Vegetables (per 100g)
+    'carrot': {'calories_per_100g': 41, 'category': 'vegetables'},
+    'broccoli': {'calories_per_100g': 34, 'category': 'vegetables'},
+    'tomato': {'calories_per_100g': 18, 'category': 'vegetables'},
+    'lettuce': {'calories_per_100g': 15, 'category': 'vegetables'},
+    'cucumber': {'calories_per_100g': 16, 'category': 'vegetables'},
+    'onion': {'calories_per_100g': 40, 'category': 'vegetables'},
+    'mixed vegetables': {'calories_per_100g': 25, 'category': 'vegetables'},
+    
+    # Proteins (per 100g)
+    'chicken': {'calories_per_100g': 165, 'category': 'proteins'},
+    'beef': {'calories_per_100g': 250, 'category': 'proteins'},
+    'fish': {'calories_per_100g': 206, 'category': 'proteins'},
+    'egg': {'calories_per_100g': 155, 'category': 'proteins'},
+    'cheese': {'calories_per_100g': 113, 'category': 'proteins'},
+    'yogurt': {'calories_per_100g': 59, 'category': 'proteins'},
+    
+    # Grains (per 100g)
+    'bread': {'calories_per_100g': 265, 'category': 'grains'},
+    'rice': {'calories_per_100g': 130, 'category': 'grains'},
+    'pasta': {'calories_per_100g': 131, 'category': 'grains'},
+    'cereal': {'calories_per_100g': 350, 'category': 'grains'},
+    'oats': {'calories_per_100g': 389, 'category': 'grains'},
+    
+    # Snacks (per 100g)
+    'chips': {'calories_per_100g': 536, 'category': 'snacks'},
+    'cookies': {'calories_per_100g': 488, 'category': 'snacks'},
+    'candy': {'calories_per_100g': 400, 'category': 'snacks'},
+    'nuts': {'calories_per_100g': 607, 'category': 'snacks'},
+    'chocolate': {'calories_per_100g': 546, 'category': 'snacks'},
+    
+    # Beverages (per 100ml)
+    'coffee': {'calories_per_100g': 2, 'category': 'beverages'},
+    'tea': {'calories_per_100g': 1, 'category': 'beverages'},
+    'juice': {'calories_per_100g': 45, 'category': 'beverages'},
+    'soda': {'calories_per_100g': 42, 'category': 'beverages'},
+    'water': {'calories_per_100g': 0, 'category': 'beverages'},
+    'milk': {'calories_per_100g': 42, 'category': 'beverages'},
+    
+    # Mixed/General foods
+    'mixed food': {'calories_per_100g': 200, 'category': 'mixed'},
+    'cooked food': {'calories_per_100g': 180, 'category': 'mixed'},
+    'salad': {'calories_per_100g': 50, 'category': 'mixed'},
+    'sandwich': {'calories_per_100g': 250, 'category': 'mixed'},
+    'pizza': {'calories_per_100g': 266, 'category': 'mixed'},
+    'burger': {'calories_per_100g': 295, 'category': 'mixed'},
+    'pasta_dish': {'calories_per_100g': 200, 'category': 'mixed'},
+    'soup': {'calories_per_100g': 80, 'category': 'mixed'},
+})
+
+# Calorie multipliers per portion size
+_PORTION_MULTIPLIERS = MappingProxyType({
+    'small': 0.5,
+    'medium': 1.0,
+    'large': 1.5,
+    'extra_large': 2.0
+})
 
 class CalorieEstimator:
     """
@@ -7,76 +83,33 @@ class CalorieEstimator:
     Uses a comprehensive food database with nutritional information.
     """
     
-    def __init__(self):
-        self.food_database = self._load_food_database()
-        self.portion_multipliers = {
-            'small': 0.5,
-            'medium': 1.0,
-            'large': 1.5,
-            'extra_large': 2.0
-        }
+    __slots__ = (
+        'food_database', 'portion_multipliers', '_token_index',
+        '_name_to_idx', '_cal', '_cat', '_portion_to_idx', '_unknown_portion_idx',
+        '_weights', '_multipliers', '_foods_by_category', '_calorie_cache'
+    )
     
-    def _load_food_database(self):
-        """Load comprehensive food database with calorie information"""
-        return {
-            # Fruits (per 100g)
-            'apple': {'calories_per_100g': 52, 'category': 'fruits'},
-            'banana': {'calories_per_100g': 89, 'category': 'fruits'},
-            'orange': {'calories_per_100g': 47, 'category': 'fruits'},
-            'strawberry': {'calories_per_100g': 32, 'category': 'fruits'},
-            'grape': {'calories_per_100g': 62, 'category': 'fruits'},
-            'lemon': {'calories_per_100g': 29, 'category': 'fruits'},
-            'mixed fruits': {'calories_per_100g': 50, 'category': 'fruits'},
-            
-            # Vegetables (per 100g)
-            'carrot': {'calories_per_100g': 41, 'category': 'vegetables'},
-            'broccoli': {'calories_per_100g': 34, 'category': 'vegetables'},
-            'tomato': {'calories_per_100g': 18, 'category': 'vegetables'},
-            'lettuce': {'calories_per_100g': 15, 'category': 'vegetables'},
-            'cucumber': {'calories_per_100g': 16, 'category': 'vegetables'},
-            'onion': {'calories_per_100g': 40, 'category': 'vegetables'},
-            'mixed vegetables': {'calories_per_100g': 25, 'category': 'vegetables'},
-            
-            # Proteins (per 100g)
-            'chicken': {'calories_per_100g': 165, 'category': 'proteins'},
-            'beef': {'calories_per_100g': 250, 'category': 'proteins'},
-            'fish': {'calories_per_100g': 206, 'category': 'proteins'},
-            'egg': {'calories_per_100g': 155, 'category': 'proteins'},
-            'cheese': {'calories_per_100g': 113, 'category': 'proteins'},
-            'yogurt': {'calories_per_100g': 59, 'category': 'proteins'},
-            
-            # Grains (per 100g)
-            'bread': {'calories_per_100g': 265, 'category': 'grains'},
-            'rice': {'calories_per_100g': 130, 'category': 'grains'},
-            'pasta': {'calories_per_100g': 131, 'category': 'grains'},
-            'cereal': {'calories_per_100g': 350, 'category': 'grains'},
-            'oats': {'calories_per_100g': 389, 'category': 'grains'},
-            
-            # Snacks (per 100g)
-            'chips': {'calories_per_100g': 536, 'category': 'snacks'},
-            'cookies': {'calories_per_100g': 488, 'category': 'snacks'},
-            'candy': {'calories_per_100g': 400, 'category': 'snacks'},
-            'nuts': {'calories_per_100g': 607, 'category': 'snacks'},
-            'chocolate': {'calories_per_100g': 546, 'category': 'snacks'},
-            
-            # Beverages (per 100ml)
-            'coffee': {'calories_per_100g': 2, 'category': 'beverages'},
-            'tea': {'calories_per_100g': 1, 'category': 'beverages'},
-            'juice': {'calories_per_100g': 45, 'category': 'beverages'},
-            'soda': {'calories_per_100g': 42, 'category': 'beverages'},
-            'water': {'calories_per_100g': 0, 'category': 'beverages'},
-            'milk': {'calories_per_100g': 42, 'category': 'beverages'},
-            
-            # Mixed/General foods
-            'mixed food': {'calories_per_100g': 200, 'category': 'mixed'},
-            'cooked food': {'calories_per_100g': 180, 'category': 'mixed'},
-            'salad': {'calories_per_100g': 50, 'category': 'mixed'},
-            'sandwich': {'calories_per_100g': 250, 'category': 'mixed'},
-            'pizza': {'calories_per_100g': 266, 'category': 'mixed'},
-            'burger': {'calories_per_100g': 295, 'category': 'mixed'},
-            'pasta_dish': {'calories_per_100g': 200, 'category': 'mixed'},
-            'soup': {'calories_per_100g': 80, 'category': 'mixed'},
-        }
+    # Maximum number of memoized estimates kept per instance
+    cache_size = 1024
+    
+    # Typical serving weights in grams by food category and portion size
+    serving_weights = {
+        'fruits': {'small': 80, 'medium': 150, 'large': 250, 'extra_large': 350},
+        'vegetables': {'small': 60, 'medium': 120, 'large': 200, 'extra_large': 300},
+        'proteins': {'small': 100, 'medium': 150, 'large': 250, 'extra_large': 350},
+        'grains': {'small': 50, 'medium': 100, 'large': 150, 'extra_large': 200},
+        'snacks': {'small': 30, 'medium': 60, 'large': 100, 'extra_large': 150},
+        'beverages': {'small': 150, 'medium': 250, 'large': 350, 'extra_large': 500},
+        'mixed': {'small': 100, 'medium': 200, 'large': 300, 'extra_large': 400}
+    }
+    
+    def __init__(self):
+        # Shared read-only references; add_custom_food builds a new database
+        self.food_database = _FOOD_DB
+        self.portion_multipliers = _PORTION_MULTIPLIERS
+        self._build_token_index()
+        self._build_lookup_tables()
+        self._calorie_cache = {}
     
     def estimate_calories(self, food_name, confidence, portion_size='medium'):
         """
@@ -94,93 +127,182 @@ class CalorieEstimator:
             # Normalize food name (lowercase, remove spaces)
             normalized_name = food_name.lower().strip()
             
-            # Find matching food in database
-            food_info = self._find_food_match(normalized_name)
-            
-            if not food_info:
-                # If no exact match, try to find similar foods
-                food_info = self._find_similar_food(normalized_name)
-            
-            if not food_info:
-                # Default to mixed food if no match found
-                food_info = self.food_database.get('mixed food', {'calories_per_100g': 200})
-            
-            # Get base calories per 100g
-            base_calories = food_info['calories_per_100g']
+            # Quantize confidence so near-identical detections share a cache entry
+            confidence = round(float(confidence), 2)
             
-            # Apply portion size multiplier
-            portion_multiplier = self.portion_multipliers.get(portion_size, 1.0)
+            # Portion sizes are part of the cache key, so they must be plain strings
+            if not isinstance(portion_size, str):
+                raise TypeError(f"portion_size must be a string, got {type(portion_size).__name__}")
             
-            # Estimate weight based on portion size (rough estimates)
-            estimated_weight = self._estimate_weight(portion_size, food_info['category'])
-            
-            # Calculate total calories
-            total_calories = (base_calories * estimated_weight / 100) * portion_multiplier
-            
-            # Apply confidence adjustment (reduce calories if confidence is low)
-            confidence_adjustment = 0.7 + (confidence * 0.3)  # Range: 0.7 to 1.0
-            adjusted_calories = total_calories * confidence_adjustment
-            
-            return max(10, adjusted_calories)  # Minimum 10 calories
-            
-        except Exception as e:
+        except (AttributeError, TypeError, ValueError) as e:
             print(f"Error estimating calories for {food_name}: {str(e)}")
             return 150  # Default fallback calories
+        
+        return self._estimate_fast(normalized_name, confidence, portion_size)
     
-    def _find_food_match(self, food_name):
-        """Find exact match in food database"""
-        return self.food_database.get(food_name)
+    def estimate_batch(self, food_names, confidences, portion_sizes):
+        """
+        Estimate calories for several food items at once.
+        
+        Args:
+            food_names (list): Names of the food items
+            confidences (list): Confidence scores from detection (0-1)
+            portion_sizes (list): Portion size of each item
+        
+        Returns:
+            np.ndarray: Estimated calories for each item
+        """
+        food_idx = np.array([self._match_food_index(name.lower().strip()) for name in food_names],
+                            dtype=np.intp)
+        portion_idx = np.array([self._portion_to_idx.get(portion, self._unknown_portion_idx)
+                                for portion in portion_sizes], dtype=np.intp)
+        
+        # Quantize confidence the same way as estimate_calories
+        confidences = np.round(np.asarray(confidences, dtype=np.float64), 2)
+        
+        estimated_weights = self._weights[self._cat[food_idx], portion_idx]
+        total_calories = (self._cal[food_idx] * estimated_weights / 100) * self._multipliers[portion_idx]
+        
+        return np.maximum(10, total_calories * (0.7 + confidences * 0.3))  # Minimum 10 calories
     
-    def _find_similar_food(self, food_name):
-        """Find similar food items using keyword matching"""
-        # Simple keyword matching
-        keywords = food_name.split()
+    def _estimate_fast(self, normalized_name, confidence, portion_size):
+        """
+        Estimate calories for an already normalized food name and quantized
+        confidence. Results are memoized per instance.
+        """
+        cache_key = (normalized_name, confidence, portion_size)
+        calories = self._calorie_cache.get(cache_key)
+        if calories is not None:
+            return calories
         
-        for db_food, info in self.food_database.items():
-            db_keywords = db_food.split()
-            
-            # Check if any keywords match
-            if any(keyword in db_keywords for keyword in keywords):
-                return info
+        food_idx = self._match_food_index(normalized_name)
+        portion_idx = self._portion_to_idx.get(portion_size, self._unknown_portion_idx)
         
-        return None
+        # Get base calories per 100g
+        base_calories = self._cal[food_idx]
+        
+        # Apply portion size multiplier
+        portion_multiplier = self._multipliers[portion_idx]
+        
+        # Estimate weight based on portion size (rough estimates)
+        estimated_weight = self._weights[self._cat[food_idx], portion_idx]
+        
+        # Calculate total calories
+        total_calories = (base_calories * estimated_weight / 100) * portion_multiplier
+        
+        # Apply confidence adjustment (reduce calories if confidence is low)
+        confidence_adjustment = 0.7 + (confidence * 0.3)  # Range: 0.7 to 1.0
+        adjusted_calories = total_calories * confidence_adjustment
+        
+        calories = max(10, float(adjusted_calories))  # Minimum 10 calories
+        
+        if len(self._calorie_cache) >= self.cache_size:
+            self._calorie_cache.clear()
+        self._calorie_cache[cache_key] = calories
+        
+        return calories
     
-    def _estimate_weight(self, portion_size, category):
+    def _build_lookup_tables(self):
         """
-        Estimate weight in grams based on portion size and food category.
-        These are rough estimates for typical serving sizes.
+        Flatten the food database and serving weights into NumPy arrays so an
+        estimate is one index lookup plus a few array reads.
         """
-        base_weights = {
-            'fruits': {'small': 80, 'medium': 150, 'large': 250, 'extra_large': 350},
-            'vegetables': {'small': 60, 'medium': 120, 'large': 200, 'extra_large': 300},
-            'proteins': {'small': 100, 'medium': 150, 'large': 250, 'extra_large': 350},
-            'grains': {'small': 50, 'medium': 100, 'large': 150, 'extra_large': 200},
-            'snacks': {'small': 30, 'medium': 60, 'large': 100, 'extra_large': 150},
-            'beverages': {'small': 150, 'medium': 250, 'large': 350, 'extra_large': 500},
-            'mixed': {'small': 100, 'medium': 200, 'large': 300, 'extra_large': 400}
-        }
+        categories = list(self.serving_weights)
+        category_to_idx = {category: i for i, category in enumerate(categories)}
+        mixed_idx = category_to_idx['mixed']
+        
+        # Build everything into locals first, so a failure leaves the old tables intact
+        name_to_idx = {name: i for i, name in enumerate(self.food_database)}
+        cal = np.array([info['calories_per_100g'] for info in self.food_database.values()],
+                       dtype=np.float64)
+        # Categories without serving weights (e.g. custom foods) use 'mixed'
+        cat = np.array([category_to_idx.get(info['category'], mixed_idx)
+                        for info in self.food_database.values()], dtype=np.int8)
+        
+        # The extra last column covers unknown portion sizes (150g, no multiplier)
+        portion_to_idx = {portion: i for i, portion in enumerate(self.portion_multipliers)}
+        weights = np.array([[self.serving_weights[category].get(portion, 150)
+                             for portion in self.portion_multipliers] + [150]
+                            for category in categories], dtype=np.float64)
+        multipliers = np.array(list(self.portion_multipliers.values()) + [1.0],
+                               dtype=np.float64)
         
-        return base_weights.get(category, base_weights['mixed']).get(portion_size, 150)
+        # Group foods by category once instead of scanning the database per call
+        foods_by_category = {}
+        for name, info in self.food_database.items():
+            foods_by_category.setdefault(info['category'], {})[name] = info
+        
+        self._name_to_idx = name_to_idx
+        self._cal = cal
+        self._cat = cat
+        self._portion_to_idx = portion_to_idx
+        self._unknown_portion_idx = len(portion_to_idx)
+        self._weights = weights
+        self._multipliers = multipliers
+        self._foods_by_category = foods_by_category
+    
+    def _match_food_index(self, food_name):
+        """Get the table index of the best database match for a normalized food name"""
+        food_idx = self._name_to_idx.get(food_name)
+        
+        if food_idx is None:
+            # If no exact match, try to find similar foods
+            similar_food = self._find_similar_food_name(food_name)
+            if similar_food:
+                food_idx = self._name_to_idx[similar_food]
+        
+        if food_idx is None:
+            # Default to mixed food if no match found
+            food_idx = self._name_to_idx['mixed food']
+        
+        return food_idx
+    
+    def _build_token_index(self):
+        """
+        Build a keyword -> (database position, food name) index for similar-food
+        lookups, so matching costs one dict get per query word.
+        """
+        self._token_index = {}
+        for position, db_food in enumerate(self.food_database):
+            for token in db_food.split():
+                # Keep the first food containing the token (database order)
+                self._token_index.setdefault(token, (position, db_food))
+    
+    def _find_similar_food_name(self, food_name):
+        """Find the name of a similar food item using keyword matching"""
+        matches = filter(None, map(self._token_index.get, food_name.split()))
+        
+        # Prefer the food that appears first in the database
+        best_match = min(matches, default=None)
+        return best_match[1] if best_match else None
     
     def get_food_database(self):
-        """Get the complete food database"""
+        """Get the complete food database (read-only; use add_custom_food to extend it)"""
         return self.food_database
     
     def get_foods_by_category(self, category):
         """Get all foods in a specific category"""
-        return {name: info for name, info in self.food_database.items() 
-                if info['category'] == category}
+        return dict(self._foods_by_category.get(category, {}))
     
     def add_custom_food(self, name, calories_per_100g, category='custom'):
         """Add a custom food item to the database"""
-        self.food_database[name.lower()] = {
+        # Reject non-numeric calories before touching the database or tables
+        float(calories_per_100g)
+        
+        # Build a new read-only database; the current one may be shared
+        database = dict(self.food_database)
+        database[name.lower()] = {
             'calories_per_100g': calories_per_100g,
             'category': category
         }
+        self.food_database = _read_only_database(database)
+        self._build_token_index()
+        self._build_lookup_tables()
+        self._calorie_cache.clear()
     
     def get_nutritional_info(self, food_name):
         """Get detailed nutritional information for a food item"""
-        food_info = self._find_food_match(food_name.lower())
+        food_info = self.food_database.get(food_name.lower())
         if food_info:
             return {
                 'name': food_name,
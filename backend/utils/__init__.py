@@ -1,2 +1,11 @@
 # Utils package for image processing and helper functions
+from functools import lru_cache
 
+@lru_cache(maxsize=None)
+def load_jit_kernels():
+    """Import the optional Numba kernels on first use; None when Numba is not installed"""
+    try:
+        from . import _jit_kernels
+        return _jit_kernels
+    except ImportError:
+        return None
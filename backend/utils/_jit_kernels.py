@@ -0,0 +1,39 @@
+"""
+Numba kernels for the per-pixel loops in the food detector and image_processor.
+Imported lazily through backend.utils.load_jit_kernels; callers fall back to
+numpy when Numba is not installed.
+
+All kernels are serial and release the GIL: detection and feature extraction
+run on worker threads, and Numba's default parallel backend is not safe to
+launch from several threads at once.
+"""
+import numpy as np
+from numba import njit
+
+
+@njit(cache=True, nogil=True)
+def color_histogram(hsv):
+    """Count the pixels of an HSV image in a flattened 16x16x16 histogram"""
+    counts = np.zeros(16 * 16 * 16, dtype=np.int64)
+    for y in range(hsv.shape[0]):
+        for x in range(hsv.shape[1]):
+            index = ((hsv[y, x, 0] >> 4) * 16 + (hsv[y, x, 1] >> 4)) * 16 + (hsv[y, x, 2] >> 4)
+            counts[index] += 1
+    return counts
+
+
+@njit(cache=True, nogil=True)
+def label_hsv(hsv_image, lower, upper, labels):
+    """Set bit k of each pixel's label for every color range k it falls into"""
+    for y in range(hsv_image.shape[0]):
+        for x in range(hsv_image.shape[1]):
+            h = hsv_image[y, x, 0]
+            s = hsv_image[y, x, 1]
+            v = hsv_image[y, x, 2]
+            label = 0
+            for k in range(lower.shape[0]):
+                if (lower[k, 0] <= h <= upper[k, 0] and
+                        lower[k, 1] <= s <= upper[k, 1] and
+                        lower[k, 2] <= v <= upper[k, 2]):
+                    label |= 1 << k
+            labels[y, x] = label
@@ -84,6 +84,17 @@ def test_models():
         print(f"✅ Image quality score: {quality_info['quality_score']:.2f}")
         print(f"   - Good quality: {quality_info['is_good_quality']}")
         
+        # Test 8: Test batch preprocessing
+        print("\n8. Testing batch preprocessing...")
+        batch_images = [test_image.quantize(16), test_image.convert('LA'), test_image]
+        batch_results = image_processor.preprocess_batch(batch_images, processes=2)
+        for image, batch_result in zip(batch_images, batch_results):
+            expected = image_processor.preprocess(image)
+            if batch_result.mode != expected.mode or not np.array_equal(np.asarray(batch_result),
+                                                                        np.asarray(expected)):
+                raise AssertionError(f"Batch result differs from preprocess for mode {image.mode}")
+        print(f"✅ Batch preprocessed {len(batch_results)} images, matching preprocess")
+        
         print("\n" + "=" * 50)
         print("🎉 All tests passed! The app is ready to run.")
         print("\nTo start the app, run:")